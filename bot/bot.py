@@ -7,7 +7,6 @@ from discord import app_commands
 import asyncio
 from google.cloud import compute_v1
 from google.cloud import monitoring_v3
-from google.cloud import storage
 from mcstatus import JavaServer
 import json
 from config import (
@@ -17,6 +16,7 @@ from config import (
     INSTANCE_NAME,
     ZONE,
     BUCKET_NAME,
+    BACKUP_MODE,
     START_EMOJI_ID,
     STOP_EMOJI_ID,
     STATUS_EMOJI_ID,
@@ -26,6 +26,7 @@ import datetime
 from datetime import timezone
 import aiohttp
 import math
+from gcp_utils import GCPManager
 
 logging.basicConfig(
     level=logging.INFO,
@@ -50,9 +51,16 @@ class MinecraftBot(commands.Bot):
 
         self.instance_client = compute_v1.InstancesClient()
         self.monitoring_client = monitoring_v3.MetricServiceClient()
-        self.storage_client = storage.Client()
+        self.gcp_manager = GCPManager(
+            self.project_id,
+            self.zone,
+            self.instance_name,
+            backup_mode=BACKUP_MODE,
+            bucket_name=BUCKET_NAME
+        )
         self.last_player_time = None
         self.shutdown_task = None
+        self.backup_report_task = None
         self.last_rate_update = None
         self.current_rates = None
 
@@ -135,46 +143,33 @@ class MinecraftBot(commands.Bot):
             # コスト計算
             cost_info = await self.calculate_costs()
 
-            request = compute_v1.StopInstanceRequest(
-                project=self.project_id,
-                zone=self.zone,
-                instance=self.instance_name
-            )
-            operation = self.instance_client.stop(request=request)
-            operation.result()
-
-            # GCSからバックアップファイル名を取得
-            backup_filename = await self.get_backup_filename()
-            backup_message = f"バックアップファイル名は {backup_filename} だよ！" if backup_filename else "バックアップファイル名を取得できなかったよ..."
+            # バックアップの完了は待たずに停止を報告する
+            await self.gcp_manager.stop_instance()
+            backup_job = self.gcp_manager.backup_job
 
             await self.get_channel(CHANNEL_ID).send(
                 f"サーバーを停止したよ！\n"
-                f"{backup_message}\n"
+                f"バックアップ（{self.gcp_manager.backup.mode}）の {backup_job.name} を作成中だよ！\n"
                 f"今回の稼働時間は {cost_info['runtime']} だったよ！\n"
                 f"今回の費用は ¥{cost_info['session_cost']:.2f} になったよ！\n"
             )
+            self.backup_report_task = self.loop.create_task(self.report_backup(backup_job))
 
         except Exception as e:
             await self.get_channel(CHANNEL_ID).send(f"エラーが発生しちゃった... : {str(e)}")
 
-    async def get_backup_filename(self):
-        try:
-            bucket = self.storage_client.bucket(BUCKET_NAME)
-            blobs = list(bucket.list_blobs(prefix="backups/"))
-            if not blobs:
-                return None
-
-            # 最新のバックアップファイルを取得
-            latest_blob = max(blobs, key=lambda blob: blob.time_created)
-
-            # メタデータからファイル名を取得
-            if 'backup_file' in latest_blob.metadata:
-                return latest_blob.metadata['backup_file']
-            else:
-                return None
-        except Exception as e:
-            logging.exception(f"GCSからのファイル名取得中にエラーが発生しました: {str(e)}")
-            return None
+    async def report_backup(self, backup_job):
+        """バックアップの完了を待って結果を報告する"""
+        if await backup_job.wait():
+            elapsed = str(backup_job.elapsed).split('.')[0]
+            await self.get_channel(CHANNEL_ID).send(
+                f"バックアップ {backup_job.name} ができたよ！（停止から {elapsed}）"
+            )
+        else:
+            logging.error(f"Backup failed: {backup_job.error}")
+            await self.get_channel(CHANNEL_ID).send(
+                f"バックアップ {backup_job.name} に失敗しちゃった... : {backup_job.error}"
+            )
 
     async def check_server_status(self):
         try:
@@ -16,6 +16,8 @@ GCP_PROJECT_ID = get_env_or_raise('GCP_PROJECT_ID')
 INSTANCE_NAME = get_env_or_raise('INSTANCE_NAME')
 ZONE = get_env_or_raise('ZONE')
 BUCKET_NAME = get_env_or_raise('BUCKET_NAME')
+# バックアップ方式（"tarball" または "snapshot"）。Terraformの backup_mode と揃えること
+BACKUP_MODE = os.getenv('BACKUP_MODE', 'tarball')
 
 # Snowflake ID
 DISCORD_CHANNEL_ID = int(get_env_or_raise('DISCORD_CHANNEL_ID'))
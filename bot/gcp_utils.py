@@ -1,11 +1,17 @@
+from google.api_core.exceptions import NotFound
 from google.cloud import compute_v1, monitoring_v3, storage, billing
+import asyncio
 import datetime
+import time
 from datetime import timezone
 import logging
 import aiohttp
 
 logger = logging.getLogger('minecraft_bot')
 
+# スナップショットに付与するラベルのキー（値はディスク名）
+BACKUP_LABEL = "minecraft-backup"
+
 class GCPInstance:
     def __init__(self, project_id, zone, instance_name):
         self.project_id = project_id
@@ -50,8 +56,239 @@ class GCPInstance:
         )
         return datetime.datetime.now() - start_time
 
+class BackupJob:
+    """バックアップの進捗を非同期に追跡する"""
+    def __init__(self, name, started_at):
+        self.name = name
+        self.started_at = started_at
+        self.finished_at = None
+        self.status = "PENDING"
+        self.error = None
+        self.task = None
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    @property
+    def elapsed(self):
+        """停止要求からの経過時間（完了済みなら所要時間）"""
+        end = self.finished_at or datetime.datetime.now(timezone.utc)
+        return end - self.started_at
+
+    def finish(self, status, error=None):
+        self.status = status
+        self.error = error
+        self.finished_at = datetime.datetime.now(timezone.utc)
+
+    async def wait(self):
+        """バックアップの完了を待ち、成功したかどうかを返す"""
+        if self.task is not None:
+            await self.task
+        return self.status == "READY"
+
+class TarballBackup:
+    """シャットダウンスクリプトがGCSにアップロードするtar.gzによるバックアップ
+
+    backup.sh は常に同じオブジェクトを上書きするため、過去のバックアップは
+    バケットのオブジェクトバージョンとして残る。復元（展開）はVM上で行う。
+    保持数の既定値は、バケットのライフサイクルルール（num_newer_versions = 5）で
+    残る最大数（現行 + 非現行5つ）に合わせている。
+    """
+    mode = "tarball"
+
+    def __init__(self, storage_client, bucket_name, blob_name="backups/world_backup.tar.gz",
+                 retention=6, poll_interval=5, timeout=300):
+        self.storage_client = storage_client
+        self.bucket_name = bucket_name
+        self.blob_name = blob_name
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    def start(self, started_at):
+        """停止要求以降にアップロードされるtar.gzの追跡を開始"""
+        job = BackupJob(self.blob_name, started_at)
+        job.task = asyncio.create_task(self._track(job))
+        return job
+
+    async def _track(self, job):
+        try:
+            job.status = "UPLOADING"
+            deadline = time.monotonic() + self.timeout
+            while time.monotonic() < deadline:
+                blob = await asyncio.to_thread(
+                    self.storage_client.bucket(self.bucket_name).get_blob, job.name
+                )
+                if blob is not None and blob.updated >= job.started_at:
+                    job.finish("READY")
+                    break
+                await asyncio.sleep(self.poll_interval)
+            else:
+                raise TimeoutError(f"{job.name} が {self.timeout} 秒以内に更新されませんでした")
+        except Exception as e:
+            logger.error(f"tar.gzバックアップ追跡エラー: {str(e)}")
+            job.finish("FAILED", e)
+            return
+
+        # 古いバージョンの削除に失敗しても、アップロード済みのバックアップは成功のまま扱う
+        try:
+            await self.prune()
+        except Exception as e:
+            logger.error(f"tar.gzバックアップ削除エラー: {str(e)}")
+
+    async def list_backups(self):
+        """tar.gzの各バージョンを古い順に取得"""
+        def fetch():
+            bucket = self.storage_client.bucket(self.bucket_name)
+            return [
+                blob for blob in bucket.list_blobs(prefix=self.blob_name, versions=True)
+                if blob.name == self.blob_name
+            ]
+        blobs = await asyncio.to_thread(fetch)
+        return sorted(blobs, key=lambda blob: blob.time_created)
+
+    async def prune(self):
+        """保持数を超えた古いバージョンを削除"""
+        backups = await self.list_backups()
+        stale = backups[:-self.retention] if self.retention else backups
+        for blob in stale:
+            # list_blobs(versions=True) の結果は generation を持つため、そのバージョンだけが削除される
+            await asyncio.to_thread(blob.delete)
+        return [f"{blob.name}#{blob.generation}" for blob in stale]
+
+    async def restore_latest(self):
+        """最新バージョンのtar.gzのURIを返す（展開はVM上で行う）"""
+        backups = await self.list_backups()
+        if not backups:
+            raise RuntimeError("復元できるバックアップがありません")
+        latest = backups[-1]
+        return f"gs://{self.bucket_name}/{latest.name}#{latest.generation}"
+
+class SnapshotBackup:
+    """ワールドを置く永続ディスク（/opt/minecraft_server にマウント）のスナップショットによるバックアップ
+
+    スナップショットは同じディスクの前回分との差分のみを保存するため、
+    所要時間はワールドの総容量ではなく変更量に比例する。
+    """
+    mode = "snapshot"
+
+    def __init__(self, project_id, zone, disk_name, retention=7, poll_interval=5,
+                 timeout=600, disks_client=None, snapshots_client=None):
+        self.project_id = project_id
+        self.zone = zone
+        self.disk_name = disk_name
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.disks_client = disks_client or compute_v1.DisksClient()
+        self.snapshots_client = snapshots_client or compute_v1.SnapshotsClient()
+
+    def start(self, started_at):
+        """スナップショットの作成を開始し、完了をバックグラウンドで追跡"""
+        job = BackupJob(f"{self.disk_name}-{started_at.strftime('%Y%m%d-%H%M%S')}", started_at)
+        job.task = asyncio.create_task(self._create(job))
+        return job
+
+    async def _create(self, job):
+        try:
+            snapshot = compute_v1.Snapshot(
+                name=job.name,
+                labels={BACKUP_LABEL: self.disk_name}
+            )
+            job.status = "CREATING"
+            operation = await asyncio.to_thread(
+                self.disks_client.create_snapshot,
+                project=self.project_id,
+                zone=self.zone,
+                disk=self.disk_name,
+                snapshot_resource=snapshot
+            )
+            # クォータ超過や名前の重複などの非同期エラーはここで例外になる
+            await asyncio.to_thread(operation.result)
+            await self._wait_ready(job)
+        except Exception as e:
+            logger.error(f"スナップショット作成エラー: {str(e)}")
+            job.finish("FAILED", e)
+            return
+
+        # 古いスナップショットの削除に失敗しても、作成済みのバックアップは成功のまま扱う
+        try:
+            await self.prune()
+        except Exception as e:
+            logger.error(f"スナップショット削除エラー: {str(e)}")
+
+    async def _wait_ready(self, job):
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            try:
+                snapshot = await asyncio.to_thread(
+                    self.snapshots_client.get,
+                    project=self.project_id,
+                    snapshot=job.name
+                )
+            except NotFound:
+                # リソースがまだ見えない場合は作成中として扱う
+                await asyncio.sleep(self.poll_interval)
+                continue
+            job.status = snapshot.status
+            if snapshot.status == "READY":
+                job.finish("READY")
+                return
+            if snapshot.status in ("FAILED", "DELETING"):
+                raise RuntimeError(f"スナップショット {job.name} の状態が {snapshot.status} になりました")
+            await asyncio.sleep(self.poll_interval)
+        raise TimeoutError(f"スナップショット {job.name} が {self.timeout} 秒以内に完了しませんでした")
+
+    async def list_backups(self):
+        """このクラスが作成したスナップショットを古い順に取得"""
+        request = compute_v1.ListSnapshotsRequest(
+            project=self.project_id,
+            filter=f"labels.{BACKUP_LABEL}={self.disk_name}"
+        )
+        snapshots = await asyncio.to_thread(
+            lambda: list(self.snapshots_client.list(request=request))
+        )
+        return sorted(
+            (snapshot for snapshot in snapshots if snapshot.status == "READY"),
+            key=lambda snapshot: snapshot.creation_timestamp
+        )
+
+    async def prune(self):
+        """保持数を超えた古いスナップショットを削除"""
+        backups = await self.list_backups()
+        stale = backups[:-self.retention] if self.retention else backups
+        for snapshot in stale:
+            operation = await asyncio.to_thread(
+                self.snapshots_client.delete,
+                project=self.project_id,
+                snapshot=snapshot.name
+            )
+            await asyncio.to_thread(operation.result)
+        return [snapshot.name for snapshot in stale]
+
+    async def restore_latest(self, disk_name=None):
+        """最新のスナップショットからディスクを作成し、その名前を返す"""
+        backups = await self.list_backups()
+        if not backups:
+            raise RuntimeError("復元できるスナップショットがありません")
+        latest = backups[-1]
+        if disk_name is None:
+            timestamp = datetime.datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+            disk_name = f"{self.disk_name}-restore-{timestamp}"
+        disk = compute_v1.Disk(name=disk_name, source_snapshot=latest.self_link)
+        operation = await asyncio.to_thread(
+            self.disks_client.insert,
+            project=self.project_id,
+            zone=self.zone,
+            disk_resource=disk
+        )
+        await asyncio.to_thread(operation.result)
+        return disk_name
+
 class GCPManager:
-    def __init__(self, project_id, zone, instance_name):
+    def __init__(self, project_id, zone, instance_name, backup_mode="tarball",
+                 disk_name="minecraft-disk", bucket_name=None, backup_retention=None):
         self.project_id = project_id
         self.zone = zone
         self.instance_name = instance_name
@@ -61,6 +298,20 @@ class GCPManager:
         self.monitoring_client = monitoring_v3.MetricServiceClient()
         self.storage_client = storage.Client()
         self.billing_client = billing.CloudBillingClient()
+
+        # バックアップ方式の初期化（保持数の既定値は方式ごとに異なる）
+        retention = {} if backup_retention is None else {"retention": backup_retention}
+        if backup_mode == "snapshot":
+            self.backup = SnapshotBackup(project_id, zone, disk_name, **retention)
+        elif backup_mode == "tarball":
+            self.backup = TarballBackup(
+                self.storage_client,
+                bucket_name or f"{project_id}-minecraft-backups",
+                **retention
+            )
+        else:
+            raise ValueError(f"Unknown backup mode: {backup_mode}")
+        self.backup_job = None
         
         # レート情報のキャッシュ
         self.last_rate_update = None
@@ -82,19 +333,31 @@ class GCPManager:
             raise
 
     async def stop_instance(self):
-        """インスタンスを停止"""
+        """インスタンスを停止し、バックアップの追跡を開始"""
         try:
+            started_at = datetime.datetime.now(timezone.utc)
             request = compute_v1.StopInstanceRequest(
                 project=self.project_id,
                 zone=self.zone,
                 instance=self.instance_name
             )
             operation = self.instance_client.stop(request=request)
-            return operation.result()
+            result = operation.result()
+            # 完了は待たずに返す（進捗は self.backup_job で確認できる）
+            self.backup_job = self.backup.start(started_at)
+            return result
         except Exception as e:
             logger.error(f"インスタンス停止エラー: {str(e)}")
             raise
 
+    async def restore_latest_backup(self):
+        """最新のバックアップから復元用のリソースを用意"""
+        try:
+            return await self.backup.restore_latest()
+        except Exception as e:
+            logger.error(f"バックアップ復元エラー: {str(e)}")
+            raise
+
     def get_instance_status(self):
         """インスタンスの状態を取得"""
         instance = self.instance_client.get(
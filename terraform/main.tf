@@ -86,6 +86,34 @@ resource "google_compute_disk" "minecraft" {
   size = 20
 }
 
+# snapshotモードの保険として、ボット以外の停止（プリエンプション等）でも
+# 最大1日前の状態に戻せるよう日次スナップショットを取る
+resource "google_compute_resource_policy" "minecraft_daily_snapshot" {
+  count  = var.backup_mode == "snapshot" ? 1 : 0
+  name   = "minecraft-daily-snapshot"
+  region = var.region
+
+  snapshot_schedule_policy {
+    schedule {
+      daily_schedule {
+        days_in_cycle = 1
+        start_time    = "19:00" # 04:00 JST
+      }
+    }
+    retention_policy {
+      max_retention_days    = 7
+      on_source_disk_delete = "KEEP_AUTO_SNAPSHOTS"
+    }
+  }
+}
+
+resource "google_compute_disk_resource_policy_attachment" "minecraft_daily_snapshot" {
+  count = var.backup_mode == "snapshot" ? 1 : 0
+  name  = google_compute_resource_policy.minecraft_daily_snapshot[0].name
+  disk  = google_compute_disk.minecraft.name
+  zone  = var.zone
+}
+
 # Compute Engineインスタンス
 resource "google_compute_instance" "minecraft" {
   name         = var.instance_name
@@ -104,7 +132,8 @@ resource "google_compute_instance" "minecraft" {
   }
 
   attached_disk {
-    source = google_compute_disk.minecraft.self_link
+    source      = google_compute_disk.minecraft.self_link
+    device_name = google_compute_disk.minecraft.name
   }
 
   network_interface {
@@ -123,6 +152,27 @@ resource "google_compute_instance" "minecraft" {
       # サーバーディレクトリの設定
       SERVER_DIR="/opt/minecraft_server"
       mkdir -p $SERVER_DIR
+
+      # ワールドを永続ディスクに置く（snapshotモードはこのディスクをスナップショットする）
+      DISK_DEVICE="/dev/disk/by-id/google-${google_compute_disk.minecraft.name}"
+      if ! sudo blkid $DISK_DEVICE; then
+          sudo mkfs.ext4 -m 0 -E lazy_itable_init=0,lazy_journal_init=0,discard $DISK_DEVICE
+          # ブートディスク上の既存データを新しいディスクへ移す
+          sudo systemctl stop minecraft.service || true
+          TEMP_MOUNT="$(mktemp -d)"
+          sudo mount -o discard,defaults $DISK_DEVICE $TEMP_MOUNT
+          sudo cp -a $SERVER_DIR/. $TEMP_MOUNT/
+          sudo umount $TEMP_MOUNT
+          rmdir $TEMP_MOUNT
+      fi
+      if ! grep -q "$DISK_DEVICE" /etc/fstab; then
+          echo "$DISK_DEVICE $SERVER_DIR ext4 discard,defaults,nofail 0 2" | sudo tee -a /etc/fstab
+      fi
+      if ! mountpoint -q $SERVER_DIR; then
+          sudo systemctl stop minecraft.service || true
+          sudo mount $SERVER_DIR
+      fi
+      sudo chown $USER:$USER $SERVER_DIR
       cd $SERVER_DIR
 
       # 必要なパッケージのインストール
@@ -157,6 +207,7 @@ resource "google_compute_instance" "minecraft" {
       [Unit]
       Description=Minecraft Server
       After=network.target
+      RequiresMountsFor=$SERVER_DIR
 
       [Service]
       User=$USER
@@ -220,6 +271,10 @@ resource "google_compute_instance" "minecraft" {
 
     shutdown-script = <<-EOF
       #!/bin/bash
+      # ワールドの保存を停止完了より前に終わらせるため、サーバーの停止はフォアグラウンドで行う
+      echo "Minecraftサーバーを停止します"
+      sudo systemctl stop minecraft || echo "Minecraftサーバーの停止に失敗しました"
+
       nohup bash -c '
       set -e
       exec > >(tee /var/log/shutdown-script.log) 2>&1
@@ -227,10 +282,11 @@ resource "google_compute_instance" "minecraft" {
       MINECRAFT_DIR="/opt/minecraft_server"
 
       echo "シャットダウンスクリプトを開始します"
-      echo "Minecraftサーバーを停止します"
-      sudo systemctl stop minecraft || echo "Minecraftサーバーの停止に失敗しました"
 
-      sh $MINECRAFT_DIR/backup.sh
+      # snapshotモードではボットが停止後にディスクのスナップショットを作成する
+      if [ "${var.backup_mode}" = "tarball" ]; then
+        sh $MINECRAFT_DIR/backup.sh
+      fi
 
       echo "シャットダウンスクリプトが正常に完了しました"
       ' > /dev/null 2>&1 &
@@ -16,4 +16,14 @@ variable "zone" {
 variable "instance_name" {
   description = "Name for the Minecraft server instance"
   default     = "minecraft-server"
-}
\ No newline at end of file
+}
+
+variable "backup_mode" {
+  description = "Backup mode on shutdown: tarball (backup.sh uploads world to GCS) or snapshot (bot snapshots the world disk)"
+  default     = "tarball"
+
+  validation {
+    condition     = contains(["tarball", "snapshot"], var.backup_mode)
+    error_message = "backup_mode must be either \"tarball\" or \"snapshot\"."
+  }
+}
@@ -0,0 +1,252 @@
+import asyncio
+import datetime
+from datetime import timezone
+import pytest
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+from google.api_core.exceptions import NotFound
+from bot.gcp_utils import GCPManager, SnapshotBackup, TarballBackup
+
+class FakeOperation:
+    def __init__(self, result=None):
+        self._result = result
+
+    def result(self):
+        return self._result
+
+class FakeCompute:
+    """スナップショットの作成に latency 秒かかるCompute Engineの代替"""
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.snapshots = {}
+        self.disks = {}
+        self.counter = 0
+        self.fail_snapshots = False
+        self.fail_deletes = False
+        # 作成直後の get が NotFound になる回数
+        self.not_found_gets = 0
+
+    def add_snapshot(self, project, name, labels):
+        self.counter += 1
+        self.snapshots[name] = SimpleNamespace(
+            name=name,
+            labels=labels,
+            status="CREATING",
+            created_at=datetime.datetime.now(timezone.utc),
+            creation_timestamp=f"{self.counter:04d}",
+            self_link=f"projects/{project}/global/snapshots/{name}"
+        )
+
+    def status(self, snapshot):
+        if self.fail_snapshots:
+            return "FAILED"
+        elapsed = (datetime.datetime.now(timezone.utc) - snapshot.created_at).total_seconds()
+        if elapsed < self.latency / 2:
+            return "CREATING"
+        if elapsed < self.latency:
+            return "UPLOADING"
+        return "READY"
+
+class FakeDisksClient:
+    def __init__(self, compute):
+        self.compute = compute
+
+    def create_snapshot(self, project, zone, disk, snapshot_resource):
+        self.compute.add_snapshot(project, snapshot_resource.name, dict(snapshot_resource.labels))
+        return FakeOperation()
+
+    def insert(self, project, zone, disk_resource):
+        self.compute.disks[disk_resource.name] = disk_resource.source_snapshot
+        return FakeOperation()
+
+class FakeSnapshotsClient:
+    def __init__(self, compute):
+        self.compute = compute
+
+    def get(self, project, snapshot):
+        if self.compute.not_found_gets > 0:
+            self.compute.not_found_gets -= 1
+            raise NotFound(f"snapshot {snapshot} not found")
+        found = self.compute.snapshots[snapshot]
+        found.status = self.compute.status(found)
+        return found
+
+    def list(self, request):
+        # "labels.<key>=<value>" 形式のフィルタのみ対応
+        key, value = request.filter.removeprefix("labels.").split("=")
+        for snapshot in list(self.compute.snapshots.values()):
+            if snapshot.labels.get(key) != value:
+                continue
+            snapshot.status = self.compute.status(snapshot)
+            yield snapshot
+
+    def delete(self, project, snapshot):
+        if self.compute.fail_deletes:
+            raise RuntimeError("delete failed")
+        del self.compute.snapshots[snapshot]
+        return FakeOperation()
+
+@pytest.fixture
+def compute():
+    return FakeCompute()
+
+@pytest.fixture
+def snapshot_backup(compute):
+    return SnapshotBackup(
+        "test-project", "test-zone", "minecraft-disk",
+        retention=2,
+        poll_interval=0.01,
+        disks_client=FakeDisksClient(compute),
+        snapshots_client=FakeSnapshotsClient(compute)
+    )
+
+def started_at(seconds):
+    return datetime.datetime(2025, 1, 1, tzinfo=timezone.utc) + datetime.timedelta(seconds=seconds)
+
+@pytest.mark.asyncio
+async def test_snapshot_progress_is_tracked(snapshot_backup):
+    """スナップショットの進捗追跡テスト"""
+    job = snapshot_backup.start(started_at(0))
+    await asyncio.sleep(0)
+
+    assert not job.done
+    assert await job.wait()
+    assert job.status == "READY"
+
+@pytest.mark.asyncio
+async def test_snapshot_retention(snapshot_backup, compute):
+    """保持数を超えたスナップショットの削除テスト"""
+    for i in range(3):
+        await snapshot_backup.start(started_at(i)).wait()
+
+    assert sorted(compute.snapshots) == [
+        "minecraft-disk-20250101-000001",
+        "minecraft-disk-20250101-000002",
+    ]
+
+@pytest.mark.asyncio
+async def test_prune_keeps_unlabeled_snapshots(snapshot_backup, compute):
+    """ラベルのないスナップショットを削除しないテスト"""
+    compute.add_snapshot("test-project", "manual-snapshot", {})
+    compute.add_snapshot("test-project", "other-disk-snapshot", {"minecraft-backup": "other-disk"})
+    for i in range(3):
+        await snapshot_backup.start(started_at(i)).wait()
+
+    assert "manual-snapshot" in compute.snapshots
+    assert "other-disk-snapshot" in compute.snapshots
+    assert len(await snapshot_backup.list_backups()) == 2
+
+@pytest.mark.asyncio
+async def test_failed_snapshot(snapshot_backup, compute):
+    """スナップショット作成失敗のテスト"""
+    compute.fail_snapshots = True
+
+    job = snapshot_backup.start(started_at(0))
+
+    assert not await job.wait()
+    assert job.status == "FAILED"
+    assert job.error is not None
+
+@pytest.mark.asyncio
+async def test_snapshot_not_found_is_pending(snapshot_backup, compute):
+    """作成直後に NotFound が返っても作成中として待つテスト"""
+    compute.not_found_gets = 3
+
+    job = snapshot_backup.start(started_at(0))
+
+    assert await job.wait()
+    assert compute.not_found_gets == 0
+
+@pytest.mark.asyncio
+async def test_snapshot_timeout(snapshot_backup, compute):
+    """完了しないスナップショットのタイムアウトテスト"""
+    compute.latency = 60
+    snapshot_backup.timeout = 0.05
+
+    job = snapshot_backup.start(started_at(0))
+
+    assert not await job.wait()
+    assert isinstance(job.error, TimeoutError)
+
+@pytest.mark.asyncio
+async def test_prune_failure_keeps_job_ready(snapshot_backup, compute):
+    """削除に失敗しても作成済みのスナップショットは成功扱いになるテスト"""
+    compute.fail_deletes = True
+    for i in range(2):
+        await snapshot_backup.start(started_at(i)).wait()
+
+    job = snapshot_backup.start(started_at(2))
+
+    assert await job.wait()
+    assert job.status == "READY"
+    assert len(compute.snapshots) == 3
+
+@pytest.mark.asyncio
+async def test_restore_latest_snapshot(snapshot_backup, compute):
+    """最新のスナップショットからのディスク作成テスト"""
+    for i in range(2):
+        await snapshot_backup.start(started_at(i)).wait()
+
+    disk_name = await snapshot_backup.restore_latest("restored-disk")
+
+    assert disk_name == "restored-disk"
+    assert compute.disks["restored-disk"].endswith("minecraft-disk-20250101-000001")
+
+@pytest.mark.asyncio
+async def test_stop_instance_does_not_wait_for_snapshot(snapshot_backup):
+    """スナップショットの完了を待たずに停止が返るテスト"""
+    with patch('bot.gcp_utils.compute_v1.InstancesClient'), \
+         patch('bot.gcp_utils.compute_v1.DisksClient'), \
+         patch('bot.gcp_utils.compute_v1.SnapshotsClient'), \
+         patch('bot.gcp_utils.monitoring_v3.MetricServiceClient'), \
+         patch('bot.gcp_utils.storage.Client'), \
+         patch('bot.gcp_utils.billing.CloudBillingClient'):
+        manager = GCPManager("test-project", "test-zone", "test-instance", backup_mode="snapshot")
+    manager.backup = snapshot_backup
+
+    await manager.stop_instance()
+
+    assert not manager.backup_job.done
+    assert await manager.backup_job.wait()
+
+@pytest.mark.asyncio
+async def test_tarball_upload_is_tracked():
+    """tar.gzのアップロード追跡テスト"""
+    stop_time = datetime.datetime.now(timezone.utc)
+    blob = Mock(updated=stop_time - datetime.timedelta(hours=1))
+    storage_client = Mock()
+    storage_client.bucket.return_value.get_blob.return_value = blob
+    storage_client.bucket.return_value.list_blobs.side_effect = RuntimeError("list failed")
+    backup = TarballBackup(storage_client, "test-bucket", poll_interval=0.01)
+
+    job = backup.start(stop_time)
+    await asyncio.sleep(0.03)
+    assert not job.done
+
+    blob.updated = datetime.datetime.now(timezone.utc)
+    assert await job.wait()
+    # アップロード後に古いバージョンの削除を試み、失敗しても成功のまま扱う
+    storage_client.bucket.return_value.list_blobs.assert_called_once()
+    assert job.status == "READY"
+
+@pytest.mark.asyncio
+async def test_tarball_prune_deletes_old_versions():
+    """tar.gzの古いバージョンのみを削除するテスト"""
+    name = "backups/world_backup.tar.gz"
+    versions = [Mock(time_created=i, generation=i) for i in range(3)]
+    for blob in versions:
+        blob.name = name
+    other = Mock(time_created=0, generation=0)
+    other.name = "backups/world_backup.tar.gz.tmp"
+    storage_client = Mock()
+    storage_client.bucket.return_value.list_blobs.return_value = versions + [other]
+    backup = TarballBackup(storage_client, "test-bucket", retention=2)
+
+    await backup.prune()
+
+    storage_client.bucket.return_value.list_blobs.assert_called_with(prefix=name, versions=True)
+    versions[0].delete.assert_called_once()
+    versions[1].delete.assert_not_called()
+    versions[2].delete.assert_not_called()
+    other.delete.assert_not_called()
+    assert await backup.restore_latest() == f"gs://test-bucket/{name}#2"